@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# Benchmark the start-up time of main.py and the time to parse config.yaml
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import config
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark the start-up and the config parsing of YaPyTo.')
+    parser.add_argument('-n', "--repeat", help="repeat times", type=int, default=20, required=False)
+    parser.add_argument("--subtasks", help="subtasks sum of the benchmark config.yaml", type=int, default=20,
+                        required=False)
+    parser.add_argument("--cases", help="cases sum of each subtask", type=int, default=50, required=False)
+    return parser.parse_args()
+
+
+def generate_yaml_config(file: str, subtasks_sum: int, cases_sum: int) -> None:
+    with open(file, "w") as f:
+        f.write("type: default\ntime: 1s\nmemory: 256m\nsubtasks:\n")
+        for i in range(subtasks_sum):
+            f.write(f"  - score: {cases_sum}\n    type: sum\n    cases:\n")
+            for j in range(cases_sum):
+                f.write(f"      - input: {i}-{j}.in\n        output: {i}-{j}.out\n        time: 1s\n")
+
+
+def benchmark_start_up(repeat: int) -> float:
+    main = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        subprocess.run([sys.executable, main, "-h"], stdout=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - start_time) / repeat
+
+
+def benchmark_parse(file: str, repeat: int, loader) -> tuple:
+    config.get_yaml_loader = lambda: loader
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        problem_config = config.load_yaml_config_file(file)
+    return (time.perf_counter() - start_time) / repeat, problem_config.to_toml()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.disable(logging.CRITICAL)
+    import yaml
+
+    print(f"Start-up of main.py -h: {benchmark_start_up(args.repeat) * 1000:.1f} ms")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_file = os.path.join(temp_dir, "config.yaml")
+        generate_yaml_config(config_file, args.subtasks, args.cases)
+        print(f"Parse config.yaml with {args.subtasks} subtasks, {args.subtasks * args.cases} cases, "
+              f"{os.path.getsize(config_file)} bytes:")
+        python_time, python_config = benchmark_parse(config_file, args.repeat, yaml.FullLoader)
+        print(f"  yaml.FullLoader: {python_time * 1000:.1f} ms")
+        safe_time, safe_config = benchmark_parse(config_file, args.repeat, yaml.SafeLoader)
+        print(f"  yaml.SafeLoader: {safe_time * 1000:.1f} ms, same config: {safe_config == python_config}")
+        if hasattr(yaml, "CSafeLoader"):
+            c_time, c_config = benchmark_parse(config_file, args.repeat, yaml.CSafeLoader)
+            print(f"  yaml.CSafeLoader: {c_time * 1000:.1f} ms, {python_time / c_time:.1f}x faster than FullLoader, "
+                  f"{safe_time / c_time:.1f}x faster than SafeLoader, same config: {c_config == python_config}")
+        else:
+            print("  yaml.CSafeLoader: libyaml is not available, yaml.SafeLoader is used")
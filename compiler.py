@@ -0,0 +1,85 @@
+import hashlib
+import logging
+import os
+import shutil
+import sys
+
+logger = logging.getLogger()
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "yapyto")
+COMPILERS = {".c": ("CC", "gcc"), ".cc": ("CXX", "g++"), ".cpp": ("CXX", "g++"), ".cxx": ("CXX", "g++")}
+
+
+def get_compiler(source: str) -> None | list:
+    # The compiler can be changed by the CC and CXX environment variables
+    suffix = os.path.splitext(source)[1].lower()
+    if suffix not in COMPILERS:
+        logger.error(f"Source file {source} is not a C/C++ source file.")
+        return
+    env, default = COMPILERS[suffix]
+    return [os.environ.get(env, default)]
+
+
+def get_compiler_info(compiler: str) -> None | str:
+    # The resolved path, mtime and version of the compiler, so that the cache is not reused after it changes
+    import subprocess
+    path = shutil.which(compiler)
+    if path is None:
+        logger.error(f"Compiler {compiler} is not found.")
+        return
+    try:
+        result = subprocess.run([path, "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError as e:
+        logger.error(f"Failed to run the compiler {compiler}: {e}")
+        return
+    path = os.path.realpath(path)
+    return f"{path}\0{os.path.getmtime(path)}\0{result.stdout.decode(errors='replace')}"
+
+
+def get_cache_key(source: str, compile_command: list, compiler_info: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(source, "rb") as f:
+        sha256.update(f.read())
+    sha256.update(bytes("\0".join(compile_command), "utf-8"))
+    sha256.update(bytes(compiler_info, "utf-8"))
+    return sha256.hexdigest()
+
+
+def compile_source(source: str, flags: list, cache_dir: str = DEFAULT_CACHE_DIR) -> None | str:
+    # Compile the source to the cache directory, the binary is reused if the source, compiler and flags are the same
+    if not os.path.isfile(source):
+        logger.error(f"Source file {source} is not found.")
+        return
+    compiler = get_compiler(source)
+    if compiler is None:
+        return
+    compiler_info = get_compiler_info(compiler[0])
+    if compiler_info is None:
+        return
+    compile_command = compiler + flags
+    binary = os.path.join(cache_dir, get_cache_key(source, compile_command, compiler_info))
+    if sys.platform == "win32":
+        binary += ".exe"
+    if os.path.isfile(binary):
+        logger.info(f"Reuse the compiled binary {binary} of {source}.")
+        return binary
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    import subprocess
+    # compile to a temporary file first, so that a broken binary is never cached
+    temp_binary = f"{binary}.{os.getpid()}.tmp"
+    logger.info(f"Compile {source} with command {compile_command}.")
+    try:
+        result = subprocess.run(compile_command + [source, "-o", temp_binary], stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+    except OSError as e:
+        logger.error(f"Failed to run the compiler {compiler[0]}: {e}")
+        return
+    if result.returncode != 0:
+        logger.error(f"Failed to compile {source} with return code {result.returncode}, stderr are as follows:")
+        logger.warning(result.stderr.decode())
+        if os.path.exists(temp_binary):
+            os.remove(temp_binary)
+        return
+    os.replace(temp_binary, binary)
+    logger.info(f"{source} is compiled to {binary}.")
+    return binary
@@ -2,16 +2,26 @@ import json
 import logging
 import os
 
-import yaml
-
 import problem
 import util
 
 logger = logging.getLogger()
 
 
+def get_yaml_loader():
+    # yaml is imported only when a config.yaml is loaded, the libyaml loader is used if it is available
+    import yaml
+    return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
 def load_yaml_config_file(file: str) -> None | problem.Config:
-    config = yaml.load(open(file, "r"), Loader=yaml.FullLoader)
+    with open(file, "r") as f:
+        # the same as yaml.load, so that yaml is only imported by get_yaml_loader
+        loader = get_yaml_loader()(f)
+        try:
+            config = loader.get_single_data()
+        finally:
+            loader.dispose()
 
     # convert judge type and checker type
     problem_type = config["type"] if "type" in config and config["type"] is not None else "default"
@@ -48,7 +58,7 @@ def load_yaml_config_file(file: str) -> None | problem.Config:
         min_subtask = False
         sum_subtask = False
         for i, subtask in enumerate(config["subtasks"]):
-            logger.debug(f"Now checking subtask {i}, id: {subtask['id'] if 'id' in subtask else None}")
+            logger.debug("Now checking subtask %d, id: %s", i, subtask.get("id"))
             subtask["id"] = subtask["id"] if "id" in subtask and type(subtask["id"]) is int else i + 1
             # check subtask and cases
             if "type" not in subtask or subtask["type"] is None:
@@ -80,11 +90,11 @@ def load_yaml_config_file(file: str) -> None | problem.Config:
                     else:
                         cases_score_sum += case["score"]
                 elif "score" in case and case["score"] is not None:
-                    logger.warning(f"Subtask {i} Case {j} score is not a positive integer, this case will be ignored.")
+                    logger.warning("Subtask %d Case %d score is not a positive integer, this case will be ignored.", i, j)
             if len(legal_cases) == 0:
                 logger.warning(f"Subtask {i} Subtask has no valid cases, this subtask will be ignored.")
                 continue
-            logger.info(f"Subtask {i} has {len(legal_cases)} valid cases.")
+            logger.info("Subtask %d has %d valid cases.", i, len(legal_cases))
             if all_cases_have_score:
                 if "score" in subtask and subtask["score"] is not None:
                     if cases_score_sum != subtask["score"]:
@@ -151,7 +161,7 @@ def load_yaml_config_file(file: str) -> None | problem.Config:
             task_type = "simple"
             logger.info("Subtask type is sum, convert to task type simple. But some args will be ignored.")
             for i, subtask in enumerate(hydro_subtasks):
-                logger.debug(f"Now processing subtask {i}, id: {subtask['id'] if 'id' in subtask else None}")
+                logger.debug("Now processing subtask %d, id: %s", i, subtask.get("id"))
                 if "time" in subtask or "memory" in subtask or "if" in subtask:
                     logger.warning(
                         f"Subtask {i} has time, memory or if limit, but this subtask will be change to cases, these args will be ignored.")
@@ -210,7 +220,7 @@ def load_yaml_config_file(file: str) -> None | problem.Config:
             task_type = "subtask"
             logger.info("Subtask type is min, convert to task type subtask.")
             for i, subtask in enumerate(hydro_subtasks):
-                logger.debug(f"Now processing subtask {i}, id: {subtask['id'] if 'id' in subtask else None}")
+                logger.debug("Now processing subtask %d, id: %s", i, subtask.get("id"))
                 if "time" in subtask or "memory" in subtask or "if" in subtask:
                     logger.warning(
                         f"Subtask {i} has time, memory or if limit, sastoj not support, but these args will be kept.")
@@ -225,8 +235,8 @@ def load_yaml_config_file(file: str) -> None | problem.Config:
                 cases = []
                 for case in subtasks_cases[i]:
                     if "score" in case:
-                        logger.warning(
-                            f"Subtask {i} Case {case['input']}/{case['output']} has score, it will be ignored.")
+                        logger.warning("Subtask %d Case %s/%s has score, it will be ignored.", i, case["input"],
+                                       case["output"])
                     case_time_limit, case_memory_limit = problem.get_case_limit(case)
                     cases.append(problem.Case(case["input"], case["output"], None, case_time_limit, case_memory_limit))
                 now_subtask = problem.Subtask(subtask["score"], sorted(cases), subtask["id"], subtask_if,
@@ -248,7 +258,20 @@ def load_yaml_config_file(file: str) -> None | problem.Config:
 
 
 def load_json_config_file(file: str) -> None | problem.Config:
-    config_file = json.load(open(file, "r"))
+    with open(file, "r") as f:
+        config_file = json.load(f)
+    return load_sastoj_config(config_file)
+
+
+def load_toml_config_file(file: str) -> None | problem.Config:
+    import toml
+    with open(file, "r") as f:
+        config_file = toml.load(f)
+    return load_sastoj_config(config_file)
+
+
+def load_sastoj_config(config_file: dict) -> None | problem.Config:
+    # config.json and config.toml share the sastoj schema
     judge_type = config_file["judge"]["judgeType"] if "judge" in config_file and "judgeType" in config_file["judge"] else "classic"
     task_type = config_file["task"]["taskType"] if "task" in config_file and "taskType" in config_file["task"] else None
     if task_type is None:
@@ -275,7 +298,7 @@ def load_json_config_file(file: str) -> None | problem.Config:
                                           case_time_limit, case_memory_limit))
                 scores.append(case["score"] if "score" in case else None)
             else:
-                logger.warning(f"Case {case['input']}/{case['answer']} is not valid, this case will be ignored.")
+                logger.warning("Case %s/%s is not valid, this case will be ignored.", case.get("input"), case.get("answer"))
         if len(cases) == 0:
             logger.error("No valid cases in config file.")
             return None
@@ -285,7 +308,9 @@ def load_json_config_file(file: str) -> None | problem.Config:
         config.cases = sorted(cases)
     elif task_type == "subtask":
         subtasks = []
-        for subtask in config_file["task"]["subtasks"]:
+        for i, subtask in enumerate(config_file["task"]["subtasks"]):
+            # config.toml saved by YaPyTo has no subtask id
+            subtask.setdefault("id", i + 1)
             subtask_time_limit = subtask["time"] if "time" in subtask else None
             subtask_memory_limit = subtask["memory"] if "memory" in subtask else None
             subtask_if = subtask["if"] if "if" in subtask else []
@@ -299,7 +324,7 @@ def load_json_config_file(file: str) -> None | problem.Config:
                                      case_time_limit, case_memory_limit))
                     subtask_scores.append(case["score"] if "score" in case else None)
                 else:
-                    logger.warning(f"Case {case['input']}/{case['answer']} is not valid, this case will be ignored.")
+                    logger.warning("Case %s/%s is not valid, this case will be ignored.", case.get("input"), case.get("answer"))
             if len(subtask_cases) == 0:
                 logger.error(f"No valid cases in subtask {subtask['id'] if 'id' in subtask else None}.")
                 continue
@@ -324,11 +349,15 @@ def generate_cases(input_dir: str) -> list:
     files = os.listdir(input_dir)
     cases = []
     for file in files:
-        if file.lower().endswith(".out") or file.lower().endswith(".ans"):
-            file_name = file[:file.rfind(".")]
-            if file_name + ".in" not in files:
+        # the IO file may be compressed, such as 1.out.xz and 1.in.gz
+        plain_file = util.strip_compressed_suffix(file)
+        if plain_file.lower().endswith(".out") or plain_file.lower().endswith(".ans"):
+            file_name = plain_file[:plain_file.rfind(".")]
+            input_file = util.find_data_file(file_name + ".in", files)
+            if input_file is None:
                 logger.warning(f"file has no input file {file_name}.in .")
-            cases.append(problem.Case(file_name + ".in", file, None))
+                input_file = file_name + ".in"
+            cases.append(problem.Case(input_file, file, None))
     cases_score = util.average_score([None for _ in range(len(cases))], 100)
     for i, case in enumerate(cases):
         case.score = cases_score[i]
@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+import shutil
+
+import util
+
+logger = logging.getLogger()
+MANIFEST_FILE = "manifest.json"
+DELTA_FILE = "delta.json"
+
+
+def prefix_manifest(manifest: dict, prefix: str) -> dict:
+    # The paths in manifest are relative to the output directory and separated by /
+    return {f"{prefix}/{path}" if prefix not in ("", ".") else path: digest for path, digest in manifest.items()}
+
+
+def save_manifest(manifest: dict, output_dir: str) -> None:
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as f:
+        json.dump(dict(sorted(manifest.items())), f, indent=1)
+    logger.info(f"Save manifest of {len(manifest)} files to {output_dir}.")
+
+
+def load_manifest(path: str) -> None | dict:
+    # path is a manifest file, or a previous output directory with or without manifest
+    if os.path.isdir(path) and os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+        path = os.path.join(path, MANIFEST_FILE)
+    if os.path.isfile(path):
+        with open(path, "r") as f:
+            manifest = json.load(f)
+        logger.info(f"Load manifest of {len(manifest)} files from {path}.")
+        return manifest
+    if not os.path.isdir(path):
+        logger.error(f"Previous output {path} is not found.")
+        return
+    logger.info(f"No manifest is found in {path}, hash all the files in it.")
+    manifest = {}
+    for root, _, files in os.walk(path):
+        for f in files:
+            if f in (MANIFEST_FILE, DELTA_FILE):
+                continue
+            relative_path = os.path.relpath(os.path.join(root, f), path).replace(os.sep, "/")
+            manifest[relative_path] = util.file_hash(os.path.join(root, f))
+    return manifest
+
+
+def make_delta_bundle(manifest: dict, previous_manifest: dict, output_dir: str, bundle_dir: str) -> dict:
+    # Copy the added and changed files to the bundle, and record the deleted files in delta.json
+    added = sorted(path for path in manifest if path not in previous_manifest)
+    changed = sorted(path for path in manifest if path in previous_manifest and manifest[path] != previous_manifest[path])
+    deleted = sorted(path for path in previous_manifest if path not in manifest)
+    if os.path.exists(bundle_dir):
+        logger.warning(f"Delta bundle directory {bundle_dir} exists, it will be overwritten.")
+        shutil.rmtree(bundle_dir)
+    os.makedirs(bundle_dir)
+    size = 0
+    for path in added + changed:
+        os.makedirs(os.path.join(bundle_dir, os.path.dirname(path)), exist_ok=True)
+        shutil.copyfile(os.path.join(output_dir, path), os.path.join(bundle_dir, path))
+        size += os.path.getsize(os.path.join(bundle_dir, path))
+    delta = {"added": added, "changed": changed, "deleted": deleted}
+    with open(os.path.join(bundle_dir, DELTA_FILE), "w") as f:
+        json.dump(delta, f, indent=1)
+    save_manifest(manifest, bundle_dir)
+    logger.info(f"Delta bundle is saved to {bundle_dir}: {len(added)} added, {len(changed)} changed, "
+                f"{len(deleted)} deleted, {len(manifest) - len(added) - len(changed)} unchanged, {size} bytes.")
+    return delta
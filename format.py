@@ -3,6 +3,7 @@ import logging
 import os
 
 import config
+import delta
 import problem
 import util
 
@@ -17,7 +18,7 @@ def is_custom_data(input_dir: str) -> bool:
         if os.path.isdir(f):
             logger.warning(f"{f} is a directory, {input_dir} is not a custom data directory.")
             return False
-        elif f.endswith(".out") or f.endswith(".ans"):
+        elif util.strip_compressed_suffix(f).endswith(".out") or util.strip_compressed_suffix(f).endswith(".ans"):
             find_output = True
     if not find_output:
         logger.warning(f"No output file is found in {input_dir}.")
@@ -38,14 +39,17 @@ def is_hydro_export(input_dir: str) -> bool:
     return False
 
 
-def get_hydro_export_problems(input_dir: str) -> list:
+def get_hydro_export_problems(input_dir: str, shard: tuple = (1, 1)) -> list:
     problems = []
-    for f in os.listdir(input_dir):
+    # sort the directories so that every machine gets the same shard
+    for i, f in enumerate(sorted(os.listdir(input_dir))):
+        if not util.in_shard(i, shard):
+            continue
         if os.path.isdir(os.path.join(input_dir, f)) and \
                 os.path.exists(os.path.join(input_dir, f, "testdata")) and \
                 is_custom_data(os.path.join(input_dir, f, "testdata")):
             problems.append(os.path.join(input_dir, f))
-    logger.info(f"Find {len(problems)} problems in {input_dir}.")
+    logger.info(f"Find {len(problems)} problems in {input_dir}, shard {shard[0]}/{shard[1]}.")
     return problems
 
 
@@ -59,12 +63,19 @@ def check_config_case_file(config: problem.Config, dir: str) -> list:
     for case in config.cases:
         cases.append(case)
     for case in cases:
-        if case.input_file not in files:
-            logger.warning(f"Case input file {case.input_file} is not found in {dir}.")
+        # the IO file may be compressed, such as 1.in.gz for 1.in
+        input_file = util.find_data_file(case.input_file, files)
+        if input_file is None:
+            logger.warning("Case input file %s is not found in %s.", case.input_file, dir)
             not_found.append(case.input_file)
-        if case.answer_file not in files:
-            logger.warning(f"Case output file {case.answer_file} is not found in {dir}.")
+        else:
+            case.input_file = input_file
+        answer_file = util.find_data_file(case.answer_file, files)
+        if answer_file is None:
+            logger.warning("Case output file %s is not found in %s.", case.answer_file, dir)
             not_found.append(case.answer_file)
+        else:
+            case.answer_file = answer_file
     return not_found
 
 
@@ -92,6 +103,11 @@ def load_data_dir(input_dir: str):
                     return
                 config_file.task_type = "simple"
                 config_file.cases = cases
+    elif os.path.isfile(os.path.join(input_dir, "config.toml")):
+        logger.info(f"Find config.toml from {input_dir}, try to load it to sastoj config file")
+        config_file = config.load_toml_config_file(os.path.join(input_dir, "config.toml"))
+        if config_file is None:
+            logger.warning(f"Failed to load config.toml from {input_dir}")
     elif os.path.isfile(os.path.join(input_dir, "config.json")):
         logger.info(f"Find config.json from {input_dir}, try to load it to sastoj config file")
         config_file = config.load_json_config_file(os.path.join(input_dir, "config.json"))
@@ -104,6 +120,7 @@ def load_data_dir(input_dir: str):
             logger.error(f"Failed to generate config from {input_dir}")
             return
         logger.info(f"Config is generated from {input_dir}, find {len(config_file.cases)} cases.")
+    problem.report_case_limit()
     not_found_files = check_config_case_file(config_file, input_dir)
     if len(not_found_files) != 0:
         logger.warning(f"Case IO files {not_found_files} are not found in {input_dir}, try to generate empty file.")
@@ -111,42 +128,58 @@ def load_data_dir(input_dir: str):
     return config_file
 
 
-def convert_data_dir(config_file: problem.Config, input_dir: str, output_dir: str, rename_answer: bool = True) -> None:
+def convert_data_dir(config_file: problem.Config, input_dir: str, output_dir: str, rename_answer: bool = True) -> dict:
+    # Return the hash of each converted file, keyed by the file name
     logger.info(f"Convert data from {input_dir} to {output_dir}")
     cases = problem.get_problem_cases(config_file)
     logger.debug(f"Cases sum: {len(cases)}, rename .out to .ans: {rename_answer}")
     files = []
     for case in cases:
-        files.append((os.path.join(input_dir, case.input_file), os.path.join(output_dir, case.input_file)))
+        # the compressed IO file is decompressed, and the case refers to the decompressed file
+        input_file = util.strip_compressed_suffix(case.input_file)
+        answer_file = util.strip_compressed_suffix(case.answer_file)
+        files.append((os.path.join(input_dir, case.input_file), os.path.join(output_dir, input_file)))
         if not rename_answer:
-            files.append((os.path.join(input_dir, case.answer_file), os.path.join(output_dir, case.answer_file)))
+            files.append((os.path.join(input_dir, case.answer_file), os.path.join(output_dir, answer_file)))
         else:
             files.append((os.path.join(input_dir, case.answer_file),
-                          os.path.join(output_dir, case.answer_file.replace(".out", ".ans"))))
-    for file in files:
-        util.crlf_to_lf(file[0], file[1])
+                          os.path.join(output_dir, answer_file.replace(".out", ".ans"))))
+        case.input_file = input_file
+        case.answer_file = answer_file
+    progress = util.Progress(f"Convert {os.path.basename(os.path.normpath(input_dir))}", len(cases))
+    manifest = {}
+    for i, file in enumerate(files):
+        manifest[os.path.basename(file[1])] = util.crlf_to_lf(file[0], file[1])
+        # every case has an input file and an answer file
+        progress.update(os.path.getsize(file[1]), i % 2)
+    progress.close()
     logger.info(
         f"Data is converted from {input_dir} to {output_dir}, output directory size: {os.path.getsize(output_dir)} bytes.")
+    return manifest
 
 
-def convert_custom_dir(input_dir: str, output_dir: str, args: argparse.Namespace) -> None:
+def convert_custom_dir(input_dir: str, output_dir: str, args: argparse.Namespace) -> dict:
+    # Return the manifest of the converted files, relative to the output directory
     logger.info("Custom data format is detected, try to find config.yaml or generate config")
     config_file = load_data_dir(input_dir)
     if config_file is None:
         logger.error("Failed to load config.yaml and generate config, exit.")
         exit(1)
-    logger.info(f"Config file is loaded from {input_dir}, save to {output_dir}")
+    logger.info(f"Config file is loaded from {input_dir}, start to convert the data to {output_dir}")
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
+    manifest = convert_data_dir(config_file, input_dir, output_dir, args.rename_output)
     config_file.save(output_dir)
-    logger.info("Config file is saved, start to convert the data.")
-    convert_data_dir(config_file, input_dir, output_dir, args.rename_output)
-    logger.info("Data is converted.")
+    manifest["config.toml"] = util.file_hash(os.path.join(output_dir, "config.toml"))
+    logger.info("Data is converted and config file is saved.")
+    return manifest
 
 
-def convert_hydro_export_dir(input_dir: str, output_dir: str, args: argparse.Namespace) -> None:
-    problems = get_hydro_export_problems(input_dir)
+def convert_hydro_export_dir(input_dir: str, output_dir: str, args: argparse.Namespace) -> dict:
+    # Return the manifest of the converted files, relative to the output directory
+    problems = get_hydro_export_problems(input_dir, args.shard)
     success_count = 0
+    manifest = {}
     for problem_dir in problems:
         config_file = load_data_dir(os.path.join(problem_dir, "testdata"))
         if config_file is None:
@@ -158,9 +191,80 @@ def convert_hydro_export_dir(input_dir: str, output_dir: str, args: argparse.Nam
         output = os.path.join(output_dir, os.path.join(os.path.basename(problem_dir), "testdata"))
         if not os.path.exists(output):
             os.makedirs(output)
-        convert_data_dir(config_file, os.path.join(problem_dir, "testdata"), output, args.rename_output)
+        problem_manifest = convert_data_dir(config_file, os.path.join(problem_dir, "testdata"), output,
+                                            args.rename_output)
         config_file.save(output)
+        problem_manifest["config.toml"] = util.file_hash(os.path.join(output, "config.toml"))
+        manifest.update(delta.prefix_manifest(problem_manifest, f"{os.path.basename(problem_dir)}/testdata"))
         logger.info(
             f"Data is converted from {problem_dir} to {output_dir}, output directory size: {os.path.getsize(output_dir)} bytes.")
         success_count += 1
     logger.info(f"Convert {success_count} problems from {input_dir} to {output_dir}.")
+    return manifest
+
+
+def find_config_toml_dirs(input_dir: str) -> list:
+    # The input is a converted data directory, or a directory of problems like the hydro export
+    if os.path.isfile(os.path.join(input_dir, "config.toml")):
+        return [input_dir]
+    data_dirs = []
+    for f in sorted(os.listdir(input_dir)):
+        if os.path.isfile(os.path.join(input_dir, f, "testdata", "config.toml")):
+            data_dirs.append(os.path.join(input_dir, f, "testdata"))
+        elif os.path.isfile(os.path.join(input_dir, f, "config.toml")):
+            data_dirs.append(os.path.join(input_dir, f))
+    return data_dirs
+
+
+def validate_data_dir(data_dir: str) -> list:
+    # Check the config.toml and its case files by one directory scan, the case files are not read
+    import toml
+    with os.scandir(data_dir) as entries:
+        sizes = {e.name: e.stat().st_size for e in entries if e.is_file()}
+    try:
+        with open(os.path.join(data_dir, "config.toml"), "r") as f:
+            raw_config = toml.load(f)
+        raw_cases_sum = len(raw_config["task"].get("cases", [])) + \
+            sum(len(s.get("cases", [])) for s in raw_config["task"].get("subtasks", []))
+        config_file = config.load_sastoj_config(raw_config)
+    except (toml.TomlDecodeError, KeyError, TypeError, ValueError) as e:
+        return [f"config.toml can not be loaded: {e}"]
+    if config_file is None:
+        return ["config.toml has no valid task"]
+    issues = []
+    cases = problem.get_problem_cases(config_file)
+    if len(cases) != raw_cases_sum:
+        issues.append(f"{raw_cases_sum - len(cases)} cases are not valid")
+    if config_file.task_type == "simple":
+        score_sum = sum(c.score for c in config_file.cases if c.score is not None)
+    else:
+        score_sum = sum(s.score for s in config_file.subtasks if s.score is not None)
+    if score_sum != config_file.score:
+        issues.append(f"the sum of scores {score_sum} is not equal to the score {config_file.score}")
+    for case in cases:
+        for file in (case.input_file, case.answer_file):
+            if file not in sizes:
+                issues.append(f"{file} is not found")
+            elif sizes[file] == 0:
+                issues.append(f"{file} is empty")
+    return issues
+
+
+def validate_data_dirs(input_dir: str, jobs: int | None = None) -> dict:
+    # Validate the problems in parallel, return the issues of the problems which need to be converted again
+    data_dirs = find_config_toml_dirs(input_dir)
+    logger.info(f"Find {len(data_dirs)} problems with config.toml in {input_dir}, start to validate them.")
+    if jobs == 1 or len(data_dirs) <= 1:
+        results = list(map(validate_data_dir, data_dirs))
+    else:
+        # concurrent.futures is only imported when the problems are validated in parallel
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(validate_data_dir, data_dirs, chunksize=max(1, len(data_dirs) // 64)))
+    failed = {}
+    for data_dir, issues in zip(data_dirs, results):
+        if len(issues) != 0:
+            failed[data_dir] = issues
+            logger.warning("%s needs to be converted again: %s.", data_dir, "; ".join(issues))
+    logger.info(f"Validate {len(data_dirs)} problems, {len(failed)} problems need to be converted again.")
+    return failed
@@ -5,18 +5,22 @@ import os
 import shlex
 import shutil
 
+import compiler
+import delta
 import format
 import problem
-import process
 
 logger = logging.getLogger()
 LOG_FORMAT = '[%(levelname)s](%(asctime)s) %(filename)s:%(lineno)d - %(message)s'
-logging.basicConfig(level=logging.DEBUG, format=LOG_FORMAT)
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description='A converter that convert the config.yaml from hydro to the config.toml of sastoj schema.')
+    parser.add_argument('-v', '--verbose', help="show debug logs", action="count", default=0,
+                        required=False)
+    parser.add_argument('-q', '--quiet', help="show less logs, -q for warnings only, -qq for errors only",
+                        action="count", default=0, required=False)
     parser.add_argument('-i', '--input', help='input directory, such as ../testdata', required=False)
     parser.add_argument('-o', '--output', help='output directory', default="output", required=False)
     parser.add_argument('--rename-output', help='rename the output file to answer file', action="store_true",
@@ -26,9 +30,72 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument('-c', "--case", help="case sum", type=int, default=10, required=False)
     parser.add_argument("--generate-command", help="the command to generate the input file", required=False)
     parser.add_argument("--std-command", help="the command to generate the answer file", required=False)
+    parser.add_argument("--generator-source", help="the C/C++ source of the generator, compiled and cached",
+                        required=False)
+    parser.add_argument("--std-source", help="the C/C++ source of the std, compiled and cached", required=False)
+    parser.add_argument("--compile-flags", help="the flags to compile the sources", default="-O2", required=False)
+    parser.add_argument("--compile-cache", help="the cache directory of the compiled sources",
+                        default=compiler.DEFAULT_CACHE_DIR, required=False)
+    parser.add_argument("--duplicate", help="how to handle the duplicate generated input file",
+                        choices=["keep", "regenerate", "drop"], default="keep", required=False)
+    parser.add_argument("--duplicate-retry", help="max times to regenerate a duplicate input file", type=int,
+                        default=10, required=False)
+    parser.add_argument("--shard", help="only process the i-th of n shards, such as 1/4", type=parse_shard,
+                        default=(1, 1), required=False)
+    parser.add_argument("--seed", help="base seed, the seed of each case is appended to the generate command",
+                        type=int, required=False)
+    parser.add_argument("--merge", help="merge the output directories of shards to the output directory", nargs="+",
+                        required=False)
+    parser.add_argument("--pipeline", help="feed each generated input to the std while it is generated",
+                        action="store_true", required=False)
+    parser.add_argument("--delta", help="previous output directory or its manifest.json, "
+                                        "only the changed files are saved to the delta bundle", required=False)
+    parser.add_argument("--delta-output", help="the directory of the delta bundle", default="delta", required=False)
+    parser.add_argument("--validate", help="validate the config.toml and case files of the converted data",
+                        action="store_true", required=False)
+    parser.add_argument('-j', "--jobs", help="the number of processes to validate (default is the number of CPUs) "
+                                             "or to generate answer files (default is 1)", type=parse_jobs,
+                        required=False)
+    parser.add_argument("--sweep", help="sweep the sizes passed to the generate command, such as 1000,10000,100000",
+                        type=parse_sizes, required=False)
+    parser.add_argument("--sweep-max", help="the max size in the constraint to predict the time", type=int,
+                        required=False)
+    parser.add_argument("--sweep-repeat", help="repeat times for each size", type=int, default=3, required=False)
+    parser.add_argument("--resume", help="resume the generation from the journal in the output directory",
+                        action="store_true", required=False)
     return parser.parse_args()
 
 
+def parse_shard(shard_arg: str) -> tuple:
+    try:
+        index, total = (int(s) for s in shard_arg.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard {shard_arg} should be like i/n.")
+    if total < 1 or index < 1 or index > total:
+        raise argparse.ArgumentTypeError(f"Shard {shard_arg} should satisfy 1 <= i <= n.")
+    return index, total
+
+
+def parse_jobs(jobs_arg: str) -> int:
+    try:
+        jobs = int(jobs_arg)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Jobs {jobs_arg} should be an integer.")
+    if jobs < 1:
+        raise argparse.ArgumentTypeError(f"Jobs {jobs_arg} should be a positive integer.")
+    return jobs
+
+
+def parse_sizes(sizes_arg: str) -> list:
+    try:
+        sizes = [int(s) for s in sizes_arg.split(",") if s.strip() != ""]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Sizes {sizes_arg} should be integers separated by comma.")
+    if len(sizes) < 2 or min(sizes) < 1:
+        raise argparse.ArgumentTypeError(f"Sizes {sizes_arg} should be at least 2 positive integers.")
+    return sizes
+
+
 def check_input(input_arg: str):
     if input_arg is None:
         logger.error("Please specify the input directory.")
@@ -45,17 +112,70 @@ def check_custom_data_dir(output_arg) -> str:
     return output_arg
 
 
+def get_command(command_arg: str | None, source_arg: str | None, args: argparse.Namespace) -> None | list:
+    # The source is compiled and the binary is used as the command
+    if source_arg is None:
+        return shlex.split(command_arg) if command_arg is not None else None
+    if command_arg is not None:
+        logger.warning(f"Both command and source {source_arg} are specified, the source will be used.")
+    binary = compiler.compile_source(source_arg, shlex.split(args.compile_flags), args.compile_cache)
+    if binary is None:
+        logger.error(f"Failed to compile {source_arg}.")
+        exit(1)
+    return [binary]
+
+
+def is_nested_dir(dir_a: str, dir_b: str) -> bool:
+    # True if the directories are the same or one of them is in the other
+    dir_a, dir_b = os.path.abspath(dir_a), os.path.abspath(dir_b)
+    return os.path.commonpath([dir_a, dir_b]) in (dir_a, dir_b)
+
+
+def get_log_level(verbose: int, quiet: int) -> int:
+    # INFO by default, every -v or -q moves one level
+    return min(max(logging.INFO + (quiet - verbose) * 10, logging.DEBUG), logging.CRITICAL)
+
+
 if __name__ == '__main__':
     args = parse_args()
+    logging.basicConfig(level=get_log_level(args.verbose, args.quiet), format=LOG_FORMAT)
     input_dir = args.input
     output_dir = args.output
     generate = args.generate
 
+    if args.validate:
+        check_input(input_dir)
+        if args.delta is not None:
+            logger.warning("Delta bundle is not made when validating, --delta will be ignored.")
+        exit(1 if len(format.validate_data_dirs(input_dir, args.jobs)) != 0 else 0)
+    if args.merge is not None:
+        # the output directory is cleared before merging and the merged directories are copied into it
+        for merge_dir in args.merge:
+            if is_nested_dir(output_dir, merge_dir):
+                logger.error(f"Output directory can not be {merge_dir}, its parent or its subdirectory.")
+                exit(1)
     if os.path.isfile(output_dir):
         logger.error("Output directory is a file, not a directory.")
         exit(1)
+    previous_manifest = None
+    if args.delta is not None and (generate or args.merge is not None or args.sweep is not None):
+        logger.error("Delta bundle is only made when converting data, it can not be used with "
+                     "--generate, --merge or --sweep.")
+        exit(1)
+    if args.delta is not None:
+        # the delta bundle directory is removed before it is written, it must not contain or be in the output
+        for d in [output_dir] + ([input_dir] if input_dir is not None else []):
+            if is_nested_dir(args.delta_output, d):
+                logger.error(f"Delta output directory can not be {d}, its parent or its subdirectory.")
+                exit(1)
+        # the previous output may be the output directory, so load it before the output directory is cleared
+        previous_manifest = delta.load_manifest(args.delta)
+        if previous_manifest is None:
+            exit(1)
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
+    elif generate and args.resume:
+        logger.info("Resume the generation, the finished cases in the output directory will be reused.")
     elif len(os.listdir(output_dir)) > 0:
         logger.warning("Output directory is not empty, files will be overwritten.")
         for f in os.listdir(output_dir):
@@ -64,24 +184,84 @@ if __name__ == '__main__':
             else:
                 shutil.rmtree(os.path.join(output_dir, f))
 
-    if generate:
+    if args.merge is not None or generate:
+        # process is only needed to run commands, it is not imported when converting data
+        import process
+    if args.merge is not None:
+        for merge_dir in args.merge:
+            check_input(merge_dir)
+        config = process.merge_shard_dirs(args.merge, output_dir)
+        if config is not None:
+            config.save(output_dir)
+    elif args.sweep is not None:
+        import sweep
+        std_command = get_command(args.std_command, args.std_source, args)
+        generate_command = get_command(args.generate_command, args.generator_source, args)
+        if std_command is None or generate_command is None:
+            logger.error("Please specify the generate and std command or source to sweep.")
+            exit(1)
+        result = sweep.run_sweep(generate_command, std_command, args.sweep,
+                                 args.sweep_max if args.sweep_max is not None else max(args.sweep),
+                                 args.sweep_repeat, args.seed if args.seed is not None else 0)
+        if result is None:
+            exit(1)
+        sweep.save_sweep(result, output_dir)
+    elif generate:
         check_custom_data_dir(output_dir)
-        if args.generate_command is None:
+        std_command = get_command(args.std_command, args.std_source, args)
+        if std_command is None:
+            logger.error("Please specify the std command or source.")
+            exit(1)
+        generate_command = get_command(args.generate_command, args.generator_source, args)
+        seed = args.seed if args.seed is not None or args.shard[1] == 1 else 0
+        # the journal is only resumed with the same parameters, or the finished cases may not match them
+        journal_params = {"generate_command": generate_command, "std_command": std_command,
+                          "input": os.path.abspath(input_dir) if generate_command is None and input_dir else None,
+                          "case": args.case if generate_command is not None else None, "shard": list(args.shard),
+                          "seed": seed, "duplicate": args.duplicate, "pipeline": args.pipeline}
+        journal = process.load_journal(output_dir, journal_params) if args.resume else {}
+        if journal is None:
+            exit(1)
+        process.start_journal(output_dir, journal_params)
+        if generate_command is None:
             logger.info("Do not find generate data command, try to find input file")
             check_input(input_dir)
-            cases = process.convert_input_files(input_dir, output_dir)
+            cases = process.convert_input_files(input_dir, output_dir, args.shard)
             problem.merge_cases(cases)
+            expected_sum = len(cases)
+        else:
+            cases = process.generate_input_file(generate_command, output_dir, args.case,
+                                                args.duplicate, args.duplicate_retry, args.shard, seed, journal,
+                                                std_command if args.pipeline else None)
+            # the dropped duplicate cases are finished cases
+            expected_sum = len(range(args.shard[0] - 1, args.case, args.shard[1])) - \
+                sum(1 for record in journal.values() if record.get("dropped"))
+        cases = process.generate_answer_file(std_command, output_dir, cases, journal,
+                                             args.jobs if args.jobs is not None else 1)
+        if args.shard[1] > 1:
+            process.save_shard_cases(cases, output_dir, args.shard)
+        else:
+            process.generate_config_by_answer_file(cases).save(output_dir)
+        if len(cases) < expected_sum:
+            logger.warning(f"{expected_sum - len(cases)} cases failed, the journal is kept, "
+                           f"run again with --resume to generate them.")
         else:
-            cases = process.generate_input_file(shlex.split(args.generate_command), output_dir, args.case)
-        cases = process.generate_answer_file(shlex.split(args.std_command), output_dir, cases)
-        process.generate_config_by_answer_file(cases).save(output_dir)
+            process.remove_journal(output_dir)
     else:
         check_input(input_dir)
         logger.info(f"Start to convert the data. Input directory: {input_dir}, output directory: {output_dir}")
+        manifest = None
         if format.is_custom_data(input_dir):
-            output_dir = check_custom_data_dir(output_dir)
-            format.convert_custom_dir(input_dir, output_dir, args)
+            if args.shard[1] > 1:
+                logger.warning("Custom data directory is a single problem, the shard will be ignored.")
+            data_dir = check_custom_data_dir(output_dir)
+            manifest = format.convert_custom_dir(input_dir, data_dir, args)
+            manifest = delta.prefix_manifest(manifest, os.path.relpath(data_dir, output_dir).replace(os.sep, "/"))
         elif format.is_hydro_export(input_dir):
-            format.convert_hydro_export_dir(input_dir, output_dir, args)
+            manifest = format.convert_hydro_export_dir(input_dir, output_dir, args)
         else:
             logger.error("Unknown data format.")
+        if manifest is not None:
+            delta.save_manifest(manifest, output_dir)
+            if previous_manifest is not None:
+                delta.make_delta_bundle(manifest, previous_manifest, output_dir, args.delta_output)
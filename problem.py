@@ -1,11 +1,11 @@
 import logging
 import os
 
-import toml
-
 import util
 
 logger = logging.getLogger()
+# the cases with time or memory limit, they are reported once by report_case_limit
+case_limit_sum = {"time": 0, "memory": 0}
 
 
 class Case:
@@ -91,6 +91,7 @@ class Config:
         return config_toml
 
     def save(self, output_dir: str) -> None:
+        import toml
         with open(os.path.join(output_dir, "config.toml"), "w") as f:
             f.write(toml.dumps(self.to_toml()))
 
@@ -99,7 +100,8 @@ def merge_cases(cases: list) -> list:
     merged_cases = []
     for case in cases:
         if case in merged_cases:
-            logger.info(f"Case {case.input_file}/{case.answer_file} have the same IO file and limit. I'll merge them.")
+            logger.info("Case %s/%s have the same IO file and limit. I'll merge them.", case.input_file,
+                        case.answer_file)
             merged_cases[merged_cases.index(case)] += case
         else:
             merged_cases.append(case)
@@ -108,16 +110,20 @@ def merge_cases(cases: list) -> list:
 
 def hydro_case_legal(case: dict) -> bool:
     return (("score" in case and type(case["score"]) is int and case["score"] > 0) or "score" not in case) and \
-        ("input" in case and type(case["input"]) is str and case["input"].lower().endswith(".in")) and \
+        ("input" in case and type(case["input"]) is str and
+         util.strip_compressed_suffix(case["input"]).lower().endswith(".in")) and \
         ("output" in case and type(case["output"]) is str and (
-                case["output"].lower().endswith(".out") or case["input"].lower().endswith(".ans")))
+                util.strip_compressed_suffix(case["output"]).lower().endswith(".out") or
+                util.strip_compressed_suffix(case["output"]).lower().endswith(".ans")))
 
 
 def sastoj_case_legal(case: dict) -> bool:
     return (("score" in case and type(case["score"]) is int and case["score"] > 0) or "score" not in case) and \
-        ("input" in case and type(case["input"]) is str and case["input"].lower().endswith(".in")) and \
+        ("input" in case and type(case["input"]) is str and
+         util.strip_compressed_suffix(case["input"]).lower().endswith(".in")) and \
         ("answer" in case and type(case["answer"]) is str and (
-                case["answer"].lower().endswith(".out") or case["input"].lower().endswith(".ans")))
+                util.strip_compressed_suffix(case["answer"]).lower().endswith(".out") or
+                util.strip_compressed_suffix(case["answer"]).lower().endswith(".ans")))
 
 
 def get_problem_cases(problem: Config) -> list:
@@ -133,10 +139,19 @@ def get_case_limit(case: dict) -> tuple:
     case_memory_limit = None
     if "time" in case and case["time"] is not None:
         case_time_limit = util.convert_time(case["time"])
-        logger.warning(
-            f"Case {case['input']}/{case['output']} has time limit, time limit for case is not supported in sastoj, but it will be kept.")
+        case_limit_sum["time"] += 1
+        logger.debug("Case %s has time limit %s.", case.get("input"), case["time"])
     if "memory" in case and case["memory"] is not None:
         case_memory_limit = util.convert_memory(case["memory"])
-        logger.warning(
-            f"Case {case['input']}/{case['output']} has memory limit, memory limit for case is not supported in sastoj, but it will be kept.")
+        case_limit_sum["memory"] += 1
+        logger.debug("Case %s has memory limit %s.", case.get("input"), case["memory"])
     return case_time_limit, case_memory_limit
+
+
+def report_case_limit() -> None:
+    # Summarize the limit warnings of get_case_limit instead of warning for every case
+    for limit, count in case_limit_sum.items():
+        if count != 0:
+            logger.warning(
+                f"{count} cases have {limit} limit, {limit} limit for case is not supported in sastoj, but it will be kept.")
+        case_limit_sum[limit] = 0
@@ -1,29 +1,60 @@
+import concurrent.futures
+import hashlib
+import json
 import logging
 import os
+import shutil
 import subprocess
+import tempfile
+import threading
 import time
 
-import psutil
-
+import delta
 import problem
 import util
 
 logger = logging.getLogger()
+JOURNAL_FILE = "journal.jsonl"
+# the generator in pipeline mode is killed if its output exceeds this size
+MAX_INPUT_SIZE = 1024 ** 3
 
 
 class processTask:
-    def __init__(self, command: list, input_file: str | None, output_file: str, terminate_time: int = 10):
+    def __init__(self, command: list, input_file: str | None, output_file: str, terminate_time: int = 10,
+                 input_stream=None):
+        # input_stream: if specified, it is fed to stdin instead of the input file
         self.command = command
         self.input_file = input_file
         self.output_file = output_file
         self.runtime = 0
         self.memory = 0
         self.terminate_time = terminate_time
+        self.input_stream = input_stream
+        # hash of the output with LF line endings, it is computed while the output is written
+        self.output_hash = None
 
     def run(self) -> int:
-        infile = open(self.input_file, 'r') if self.input_file else None
-        process = subprocess.Popen(self.command, stdin=infile, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        streaming = self.input_stream is not None
+        if streaming:
+            # the input stream is fed to stdin by a thread
+            infile = self.input_stream
+            process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+            feeder = threading.Thread(target=feed_stdin, args=(infile, process.stdin), daemon=True)
+            feeder.start()
+        else:
+            infile = open(self.input_file, 'r') if self.input_file else None
+            process = subprocess.Popen(self.command, stdin=infile, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # stdout and stderr are drained while the process is running, or it blocks when the pipe is full
+        stdout_reader = teeStream(process.stdout, self.output_file)
+        stdout_thread = threading.Thread(target=stdout_reader.close, daemon=True)
+        stdout_thread.start()
+        stderr = []
+        stderr_thread = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+        stderr_thread.start()
 
+        # psutil is only imported when a command is run
+        import psutil
         psutil_process = psutil.Process(process.pid)
 
         try:
@@ -47,57 +78,341 @@ class processTask:
         if process.poll() is None:
             logger.warning("Command is still running, try to kill it.")
             process.kill()
+        if streaming:
+            # stdin is closed by the feeder when the input stream ends or the process exits
+            feeder.join()
         infile.close() if infile else None
 
-        stdout, stderr = process.communicate()
+        process.wait()
+        stdout_thread.join()
+        stderr_thread.join()
+        process.stderr.close()
+        self.output_hash = stdout_reader.hexdigest()
         if process.returncode != 0:
-            logger.error(f"Subprocess failed with return code {process.returncode},stderr are as follows:")
-            logger.warning(stderr.decode())
-        else:
-            if self.output_file is not None:
-                stdout = stdout.replace(b'\r\n', b'\n')
-                with open(self.output_file, 'wb') as f:
-                    f.write(stdout)
+            logger.error("Subprocess failed with return code %d,stderr are as follows:", process.returncode)
+            logger.warning(stderr[0].decode() if stderr else "")
+            if self.output_file is not None and os.path.isfile(self.output_file):
+                os.remove(self.output_file)
         return process.returncode
 
 
-def generate_input_file(command: list, output_dir: str, case_sum) -> list:
-    logger.info(f"Start to generate input files to {output_dir} with command {command}.")
+class teeStream:
+    # Read the stream and write the content with LF line endings to the file, the content is hashed at the same time
+    def __init__(self, stream, output_file: str | None):
+        self.stream = stream
+        self.output = open(output_file, "wb") if output_file is not None else None
+        self.sha256 = hashlib.sha256()
+        self.carry = b""
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            chunk = self.stream.read1(size) if size > 0 else self.stream.read()
+            data = self.carry + chunk
+            # keep the trailing \r to the next chunk, it may be a part of \r\n
+            self.carry = b"\r" if chunk and data.endswith(b"\r") else b""
+            data = data[:-1] if self.carry else data
+            data = data.replace(b"\r\n", b"\n")
+            if data or not chunk:
+                break
+        if self.output is not None:
+            self.output.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+    def close(self) -> None:
+        # the rest of the stream is still written to the file if the reader exits early
+        while self.read(1024 * 1024):
+            pass
+        if self.output is not None:
+            self.output.close()
+        self.stream.close()
+
+
+def feed_stdin(infile, stdin) -> None:
+    try:
+        shutil.copyfileobj(infile, stdin)
+    except (BrokenPipeError, OSError):
+        # the process exits without reading all the input
+        pass
+    finally:
+        try:
+            stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+
+
+def load_journal(output_dir: str, params: dict) -> None | dict:
+    # The journal records the finished stage of each case, the later record of a case updates the former one
+    # params: the run parameters, the journal is refused (None is returned) if it is written with other parameters
+    journal = {}
+    journal_file = os.path.join(output_dir, JOURNAL_FILE)
+    if not os.path.isfile(journal_file):
+        return journal
+    header = None
+    with open(journal_file, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line may be broken if the host crashed when writing it
+                logger.warning(f"Broken record in journal {journal_file} is ignored.")
+                continue
+            if "params" in record:
+                header = record["params"]
+                continue
+            journal.setdefault(record["input"], {}).update(record)
+    if header != json.loads(json.dumps(params)):
+        logger.error(f"Journal {journal_file} is written with other run parameters {header}, "
+                     f"it can not be resumed with {params}.")
+        return
+    logger.info(f"Load {len(journal)} cases from journal {journal_file}.")
+    return journal
+
+
+def start_journal(output_dir: str, params: dict) -> None:
+    # The first record of a new journal is the run parameters, they are checked when the journal is loaded
+    if not os.path.isfile(os.path.join(output_dir, JOURNAL_FILE)):
+        append_journal(output_dir, {"params": params})
+
+
+def append_journal(output_dir: str, record: dict) -> None:
+    with open(os.path.join(output_dir, JOURNAL_FILE), "a") as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_journal(output_dir: str, journal: dict, record: dict) -> None:
+    journal.setdefault(record["input"], {}).update(record)
+    append_journal(output_dir, record)
+
+
+def remove_journal(output_dir: str) -> None:
+    if os.path.isfile(os.path.join(output_dir, JOURNAL_FILE)):
+        os.remove(os.path.join(output_dir, JOURNAL_FILE))
+
+
+def watch_generator(generator: subprocess.Popen, tee: teeStream, terminate_time: int) -> None:
+    # Kill the generator if it runs too long or its output is too large, then the output stream reaches EOF
+    import psutil
+    try:
+        psutil_process = psutil.Process(generator.pid)
+        while generator.poll() is None:
+            cpu_times = psutil_process.cpu_times()
+            if cpu_times.user + cpu_times.system > terminate_time:
+                logger.warning("Generator is running too long, try to kill it.")
+                generator.kill()
+                break
+            if tee.size > MAX_INPUT_SIZE:
+                logger.warning(f"Generator output is larger than {MAX_INPUT_SIZE} bytes, try to kill it.")
+                generator.kill()
+                break
+            time.sleep(0.01)
+    except psutil.NoSuchProcess:
+        pass
+
+
+def run_pipeline(generate_command: list, std_command: list, input_file: str, answer_file: str,
+                 terminate_time: int = 10) -> tuple:
+    # The output of the generator is written to the input file and fed to the std at the same time
+    # Return the hash of the input (None if the generator failed) and the std task (None if the std failed)
+    with tempfile.TemporaryFile() as generator_stderr:
+        generator = subprocess.Popen(generate_command, stdout=subprocess.PIPE, stderr=generator_stderr)
+        tee = teeStream(generator.stdout, input_file)
+        watcher = threading.Thread(target=watch_generator, args=(generator, tee, terminate_time), daemon=True)
+        watcher.start()
+        task = processTask(std_command, None, answer_file, input_stream=tee)
+        # the tee is closed by the task, the rest of the input is drained until the generator exits or is killed
+        std_returncode = task.run()
+        generator.wait()
+        watcher.join()
+        if generator.returncode != 0:
+            generator_stderr.seek(0)
+            logger.error("Generator failed with return code %d,stderr are as follows:", generator.returncode)
+            logger.warning(generator_stderr.read().decode())
+            for f in (input_file, answer_file):
+                if os.path.isfile(f):
+                    os.remove(f)
+            return None, None
+    return tee.hexdigest(), task if std_returncode == 0 else None
+
+
+def generate_input_file(command: list, output_dir: str, case_sum, duplicate: str = "keep",
+                        max_retry: int = 10, shard: tuple = (1, 1), seed: int | None = None,
+                        journal: dict | None = None, std_command: list | None = None) -> list:
+    # duplicate: keep the duplicate input, regenerate it (up to max_retry times) or drop it
+    # seed: if specified, the seed of each case is appended to the command as the last argument
+    # journal: if specified, the finished cases in it are reused and the new cases are recorded
+    # std_command: if specified, each input is fed to the std while it is generated, the cases have answer files
+    logger.info(f"Start to generate input files to {output_dir} with command {command}, shard {shard[0]}/{shard[1]}.")
     cases = []
+    hashes = {}
+    duplicate_sum = 0
+    resume_sum = 0
+    progress = util.Progress("Generate input", len(range(shard[0] - 1, case_sum, shard[1])))
     for i in range(case_sum):
-        task = processTask(command, None, os.path.join(output_dir, f"{i + 1}.in"))
-        if task.run() != 0:
-            logger.error(f"Failed to generate input file {i + 1}.in.")
-        else:
-            cases.append(problem.Case(f"{i + 1}.in", None))
-    logger.info(f"Generate {len(cases)} input files to {output_dir}.")
+        if not util.in_shard(i, shard):
+            continue
+        input_name = f"{i + 1}.in"
+        input_file = os.path.join(output_dir, input_name)
+        answer_name = f"{i + 1}.ans"
+        answer_file = os.path.join(output_dir, answer_name)
+        record = journal.get(input_name, {}) if journal is not None else {}
+        if record.get("dropped"):
+            resume_sum += 1
+            duplicate_sum += 1
+            progress.update()
+            continue
+        if "hash" in record and os.path.isfile(input_file):
+            resume_sum += 1
+            if record["hash"] in hashes:
+                duplicate_sum += 1
+            hashes.setdefault(record["hash"], input_name)
+            # the answer is reused or generated by generate_answer_file
+            cases.append(problem.Case(input_name, None))
+            progress.update()
+            continue
+        retry = 0
+        while True:
+            case_command = command if seed is None else command + [str(seed + i + 1 + retry * case_sum)]
+            if std_command is None:
+                task = processTask(case_command, None, input_file)
+                digest = task.output_hash if task.run() == 0 else None
+                case = problem.Case(input_name, None)
+                record = {"input": input_name, "hash": digest}
+            else:
+                digest, task = run_pipeline(case_command, std_command, input_file, answer_file)
+                record = {"input": input_name, "hash": digest}
+                if task is None:
+                    case = None
+                    if digest is not None:
+                        logger.error("Failed to generate answer file %s.", answer_name)
+                else:
+                    case = problem.Case(input_name, answer_name, time_limit=task.runtime, memory_limit=task.memory)
+                    record.update({"answer": answer_name, "time": task.runtime, "memory": task.memory})
+            if digest is None:
+                logger.error("Failed to generate input file %s.", input_name)
+                break
+            if digest not in hashes:
+                hashes[digest] = input_name
+                if case is not None:
+                    cases.append(case)
+                if journal is not None:
+                    write_journal(output_dir, journal, record)
+                break
+            if duplicate == "regenerate" and retry < max_retry:
+                retry += 1
+                logger.debug("Input file %s is the same as %s, regenerate it (%d/%d).", input_name, hashes[digest],
+                             retry, max_retry)
+                continue
+            duplicate_sum += 1
+            if duplicate == "keep":
+                logger.warning("Input file %s is the same as %s, it will be kept.", input_name, hashes[digest])
+                if case is not None:
+                    cases.append(case)
+                if journal is not None:
+                    write_journal(output_dir, journal, record)
+            else:
+                logger.warning("Input file %s is the same as %s, it will be dropped.", input_name, hashes[digest])
+                os.remove(input_file)
+                if std_command is not None and os.path.isfile(answer_file):
+                    os.remove(answer_file)
+                if journal is not None:
+                    write_journal(output_dir, journal, {"input": input_name, "dropped": True})
+            break
+        progress.update(os.path.getsize(input_file) if os.path.isfile(input_file) else 0)
+    progress.close()
+    if resume_sum != 0:
+        logger.info(f"Reuse {resume_sum} input files from journal.")
+    logger.info(f"Generate {len(cases)} input files to {output_dir}, {len(hashes)} unique, {duplicate_sum} duplicate.")
     return cases
 
 
-def generate_answer_file(command: list, output_dir: str, cases: list) -> list:
+def run_answer_task(command: list, output_dir: str, case: problem.Case) -> tuple:
+    start_time = time.monotonic()
+    task = processTask(command, os.path.join(output_dir, case.input_file), os.path.join(output_dir, case.answer_file))
+    returncode = task.run()
+    return task, returncode, time.monotonic() - start_time
+
+
+def generate_answer_file(command: list, output_dir: str, cases: list, journal: dict | None = None,
+                         workers: int = 1) -> list:
+    # workers: if more than 1, the std runs in parallel and the largest inputs run first
     logger.info(f"Start to generate answer files to {output_dir} with command {command}.")
-    new_cases = []
-    for c in cases:
+    new_cases = [None for _ in range(len(cases))]
+    pending = []
+    resume_sum = 0
+    progress = util.Progress("Generate answer", len(cases))
+    for i, c in enumerate(cases):
+        if c.answer_file is not None and os.path.isfile(os.path.join(output_dir, c.answer_file)):
+            # the answer is generated with the input in pipeline
+            new_cases[i] = c
+            progress.update()
+            continue
         c.answer_file = c.input_file.replace(".in", ".ans")
-        task = processTask(command, os.path.join(output_dir, c.input_file),
-                           os.path.join(output_dir, c.input_file.replace(".in", ".ans")))
-        if task.run() != 0:
-            logger.error(f"Failed to generate answer file {c.answer_file}.")
-        else:
-            new_cases.append(
-                problem.Case(c.input_file, c.answer_file, time_limit=task.runtime, memory_limit=task.memory))
+        record = journal.get(c.input_file, {}) if journal is not None else {}
+        if "answer" in record and os.path.isfile(os.path.join(output_dir, record["answer"])):
+            resume_sum += 1
+            new_cases[i] = problem.Case(c.input_file, record["answer"], time_limit=record["time"],
+                                        memory_limit=record["memory"])
+            progress.update()
+            continue
+        pending.append(i)
+    if workers > 1 and len(pending) != 0:
+        # longest input first, so that the largest cases do not become a long tail of the run
+        sizes = {i: os.path.getsize(os.path.join(output_dir, cases[i].input_file)) for i in pending}
+        pending.sort(key=lambda i: sizes[i], reverse=True)
+        # the time of the std is assumed to be proportional to the input size, the makespan is predicted as a
+        # fraction of the serial time
+        total_size = max(sum(sizes.values()), 1)
+        predicted = util.simulate_makespan([sizes[i] for i in pending], workers) / total_size
+        file_order = util.simulate_makespan([sizes[i] for i in sorted(pending)], workers) / total_size
+        logger.info(f"Run {len(pending)} std tasks on {workers} workers, predicted makespan by input sizes: "
+                    f"{predicted:.0%} of the serial time (file order: {file_order:.0%}).")
+    durations = {}
+    start_time = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_answer_task, command, output_dir, cases[i]): i for i in pending}
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            c = cases[i]
+            task, returncode, durations[i] = future.result()
+            if returncode != 0:
+                logger.error("Failed to generate answer file %s.", c.answer_file)
+                progress.update()
+                continue
+            new_cases[i] = problem.Case(c.input_file, c.answer_file, time_limit=task.runtime, memory_limit=task.memory)
+            if journal is not None:
+                write_journal(output_dir, journal, {"input": c.input_file, "answer": c.answer_file,
+                                                    "time": task.runtime, "memory": task.memory})
+            progress.update(os.path.getsize(os.path.join(output_dir, c.answer_file)))
+    progress.close()
+    if workers > 1 and len(pending) != 0:
+        makespan = time.monotonic() - start_time
+        serial = max(sum(durations.values()), 1e-9)
+        logger.info(f"Actual makespan: {makespan:.2f}s, {makespan / serial:.0%} of the serial time {serial:.2f}s "
+                    f"(predicted: {predicted:.0%}).")
+    if resume_sum != 0:
+        logger.info(f"Reuse {resume_sum} answer files from journal.")
+    new_cases = [c for c in new_cases if c is not None]
     logger.info(f"Generate {len(new_cases)} answer files to {output_dir}.")
     return new_cases
 
 
-def convert_input_files(input_dir: str, output_dir: str) -> list:
+def convert_input_files(input_dir: str, output_dir: str, shard: tuple = (1, 1)) -> list:
     logger.info(f"Start to process input directory {input_dir} to output directory {output_dir}.")
-    files = os.listdir(input_dir)
+    files = sorted(f for f in os.listdir(input_dir) if util.strip_compressed_suffix(f).endswith(".in"))
     cases = []
-    for f in files:
-        if f.endswith(".in"):
-            util.crlf_to_lf(os.path.join(input_dir, f), os.path.join(output_dir, f))
-            cases.append(problem.Case(f, None))
+    for i, f in enumerate(files):
+        if util.in_shard(i, shard):
+            # the compressed input file is decompressed to the output directory
+            util.crlf_to_lf(os.path.join(input_dir, f), os.path.join(output_dir, util.strip_compressed_suffix(f)))
+            cases.append(problem.Case(util.strip_compressed_suffix(f), None))
     logger.info(f"Process {len(cases)} input files to {output_dir}.")
     return cases
 
@@ -121,3 +436,55 @@ def generate_config_by_answer_file(cases: list) -> problem.Config:
     config = problem.Config("classic", "simple", 100, max_time, max_memory)
     config.cases = cases
     return config
+
+
+def save_shard_cases(cases: list, output_dir: str, shard: tuple) -> None:
+    # Save the cases with the measured time and memory, they are merged by merge_shard_dirs later
+    shard_file = os.path.join(output_dir, f"shard-{shard[0]}-{shard[1]}.json")
+    with open(shard_file, "w") as f:
+        json.dump({"shard": shard[0], "total": shard[1],
+                   "cases": [{"input": c.input_file, "answer": c.answer_file, "time": c.time_limit,
+                              "memory": c.memory_limit} for c in cases]}, f)
+    logger.info(f"Save {len(cases)} cases of shard {shard[0]}/{shard[1]} to {shard_file}.")
+
+
+def merge_shard_dirs(shard_dirs: list, output_dir: str) -> None | problem.Config:
+    logger.info(f"Start to merge {len(shard_dirs)} shard directories to {output_dir}.")
+    cases = []
+    shards = set()
+    total = None
+    manifest = {}
+    for shard_dir in shard_dirs:
+        shard_files = [f for f in os.listdir(shard_dir) if f.startswith("shard-") and f.endswith(".json")]
+        shutil.copytree(shard_dir, output_dir, ignore=shutil.ignore_patterns("shard-*.json", JOURNAL_FILE,
+                                                                        delta.MANIFEST_FILE), dirs_exist_ok=True)
+        if os.path.isfile(os.path.join(shard_dir, delta.MANIFEST_FILE)):
+            manifest.update(delta.load_manifest(shard_dir))
+        for shard_file in shard_files:
+            with open(os.path.join(shard_dir, shard_file), "r") as f:
+                shard = json.load(f)
+            if total is not None and total != shard["total"]:
+                logger.error(f"Shard file {shard_file} has {shard['total']} shards, but {total} is expected.")
+                return
+            total = shard["total"]
+            shards.add(shard["shard"])
+            for c in shard["cases"]:
+                cases.append(problem.Case(c["input"], c["answer"], time_limit=c["time"], memory_limit=c["memory"]))
+    if len(manifest) != 0:
+        delta.save_manifest(manifest, output_dir)
+    if total is None:
+        logger.info("No shard file of generated cases is found, only the data is merged.")
+        return
+    missing = [i for i in range(1, total + 1) if i not in shards]
+    if len(missing) != 0:
+        logger.warning(f"Shards {missing} of {total} are missing, the config will only contain the merged cases.")
+    # duplicate inputs are only detected inside a shard when they are generated, check them across shards here
+    hashes = {}
+    for c in sorted(cases):
+        digest = util.file_hash(os.path.join(output_dir, c.input_file))
+        if digest in hashes:
+            logger.warning("Merged input file %s is the same as %s.", c.input_file, hashes[digest])
+        else:
+            hashes[digest] = c.input_file
+    logger.info(f"Merge {len(cases)} cases from {len(shards)} shards, {len(hashes)} unique inputs.")
+    return generate_config_by_answer_file(sorted(cases))
@@ -0,0 +1,117 @@
+import json
+import logging
+import math
+import os
+import statistics
+import tempfile
+
+import process
+
+logger = logging.getLogger()
+# the growth models to fit, t = a + c * f(n)
+MODELS = {
+    "O(1)": lambda n: 1,
+    "O(log n)": lambda n: math.log2(max(n, 2)),
+    "O(n)": lambda n: n,
+    "O(n log n)": lambda n: n * math.log2(max(n, 2)),
+    "O(n^2)": lambda n: n ** 2,
+    "O(n^3)": lambda n: n ** 3,
+}
+
+
+def measure_size(generate_command: list, std_command: list, size: int, repeat: int, seed: int,
+                 temp_dir: str) -> None | dict:
+    # The size and the seed are appended to the generate command, return the median time (ms) and memory (MB)
+    times = []
+    memories = []
+    input_file = os.path.join(temp_dir, f"{size}.in")
+    for i in range(repeat):
+        if process.processTask(generate_command + [str(size), str(seed + i)], None, input_file).run() != 0:
+            logger.error(f"Failed to generate input with size {size}.")
+            return
+        task = process.processTask(std_command, input_file, None)
+        if task.run() != 0:
+            logger.error(f"Std failed with size {size}, it may run too long or run out of memory.")
+            return
+        times.append(task.runtime * 1000)
+        memories.append(task.memory)
+    result = {"size": size, "time": statistics.median(times), "memory": statistics.median(memories),
+              "input_size": os.path.getsize(input_file)}
+    logger.info(f"Size {size}: time {result['time']:.0f} ms, memory {result['memory']:.1f} MB, "
+                f"input {result['input_size']} bytes.")
+    return result
+
+
+def fit_model(results: list) -> tuple:
+    # Fit t = a + c * f(n) by least squares for each model, the model with the least relative error is chosen
+    # a is the constant cost such as the start-up time, it needs at least 3 sizes to be fitted
+    ts = [r["time"] for r in results]
+    best = None
+    for name, f in MODELS.items():
+        xs = [f(r["size"]) for r in results]
+        mean_x = sum(xs) / len(xs)
+        mean_t = sum(ts) / len(ts)
+        if name == "O(1)" and len(results) >= 3:
+            a, c = mean_t, 0
+        elif len(results) >= 3 and sum((x - mean_x) ** 2 for x in xs) != 0:
+            c = sum((x - mean_x) * (t - mean_t) for x, t in zip(xs, ts)) / sum((x - mean_x) ** 2 for x in xs)
+            # the time never decreases with the size
+            c = max(c, 0)
+            a = mean_t - c * mean_x
+        else:
+            a = -1
+        if a < 0:
+            # the constant cost is never negative, fit t = c * f(n) instead
+            a, c = 0, sum(x * t for x, t in zip(xs, ts)) / sum(x * x for x in xs)
+        error = sum(((t - a - c * x) / max(t, 1)) ** 2 for x, t in zip(xs, ts))
+        if best is None or error < best[3]:
+            best = (name, a, c, error)
+    return best[0], best[1], best[2]
+
+
+def fit_exponent(results: list, constant: float = 0) -> None | float:
+    # Fit log (t - constant) = a + b * log n, b is the exponent of the growth
+    points = [(math.log(r["size"]), math.log(r["time"] - constant)) for r in results
+              if r["size"] > 0 and r["time"] - constant > 0]
+    if len(points) < 2:
+        return
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    denominator = sum((x - mean_x) ** 2 for x, _ in points)
+    if denominator == 0:
+        return
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / denominator
+
+
+def run_sweep(generate_command: list, std_command: list, sizes: list, max_size: int, repeat: int = 3,
+              seed: int = 0) -> None | dict:
+    logger.info(f"Start to sweep sizes {sizes}, repeat {repeat} times for each size.")
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sorted(sizes):
+            result = measure_size(generate_command, std_command, size, repeat, seed, temp_dir)
+            if result is None:
+                logger.warning(f"Sweep stops at size {size}, the std may not scale to {max_size}.")
+                break
+            results.append(result)
+    if len(results) < 2:
+        logger.error("At least 2 sizes are needed to fit the growth curve.")
+        return
+    if len(results) < 3:
+        logger.warning("Less than 3 sizes, the constant cost such as the start-up time is not fitted.")
+    model, constant, c = fit_model(results)
+    exponent = fit_exponent(results, constant) if c > 0 else 0
+    predicted_time = constant + c * MODELS[model](max_size)
+    # the suggested limit leaves a 2x margin over the prediction, rounded up to 100 ms
+    time_limit = int(((predicted_time * 2 // 100) + 1) * 100)
+    logger.info(f"Fitted growth: {model}, exponent: {exponent if exponent is None else round(exponent, 2)}, "
+                f"constant: {constant:.0f} ms.")
+    logger.info(f"Predicted time at size {max_size}: {predicted_time:.0f} ms, suggested time limit: {time_limit} ms.")
+    return {"results": results, "model": model, "exponent": exponent, "constant": constant, "max_size": max_size,
+            "predicted_time": predicted_time, "time_limit": time_limit}
+
+
+def save_sweep(sweep: dict, output_dir: str) -> None:
+    with open(os.path.join(output_dir, "sweep.json"), "w") as f:
+        json.dump(sweep, f, indent=1)
+    logger.info(f"Sweep result is saved to {os.path.join(output_dir, 'sweep.json')}.")
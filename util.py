@@ -1,7 +1,14 @@
+import hashlib
+import heapq
+import importlib
 import logging
 import re
+import sys
+import time
 
 logger = logging.getLogger()
+# the decompression modules are imported only when a compressed file is opened
+COMPRESSED_SUFFIXES = {".gz": "gzip", ".xz": "lzma", ".bz2": "bz2"}
 
 
 def extract_number(s):
@@ -64,13 +71,126 @@ def average_score(scores: list, total_score: int) -> list:
     return scores
 
 
-def crlf_to_lf(input_file: str, output_file: str) -> None:
-    input_file = open(input_file, "r")
+def get_compressed_suffix(file: str) -> str | None:
+    for suffix in COMPRESSED_SUFFIXES:
+        if file.lower().endswith(suffix):
+            return suffix
+    return None
+
+
+def strip_compressed_suffix(file: str) -> str:
+    # 1.in.gz -> 1.in, the file without compressed suffix is returned as is
+    suffix = get_compressed_suffix(file)
+    return file[:-len(suffix)] if suffix is not None else file
+
+
+def find_data_file(file: str, files: list) -> str | None:
+    # Find the file or its compressed version in the files
+    if file in files:
+        return file
+    for suffix in COMPRESSED_SUFFIXES:
+        if file + suffix in files:
+            return file + suffix
+    return None
+
+
+def open_data_file(file: str, mode: str = "rb"):
+    # Open the data file, the compressed file is decompressed by streaming
+    suffix = get_compressed_suffix(file)
+    if suffix is None:
+        return open(file, mode)
+    return importlib.import_module(COMPRESSED_SUFFIXES[suffix]).open(file, mode)
+
+
+def crlf_to_lf(input_file: str, output_file: str) -> str:
+    # Return the hash of the converted file
+    input_file = open_data_file(input_file, "rt")
     output_file = open(output_file, "wb")
+    sha256 = hashlib.sha256()
     while True:
         line = input_file.readline()
         if not line:
             break
-        output_file.write(bytes(line.replace("\r\n", "\n"), 'utf-8'))
+        line = bytes(line.replace("\r\n", "\n"), 'utf-8')
+        output_file.write(line)
+        sha256.update(line)
     input_file.close()
     output_file.close()
+    return sha256.hexdigest()
+
+
+def file_hash(file: str, chunk_size: int = 1024 * 1024) -> str:
+    # Hash the file content by chunks, the file is not loaded into memory at once
+    sha256 = hashlib.sha256()
+    with open(file, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def in_shard(index: int, shard: tuple) -> bool:
+    # shard is (i, n), 1 <= i <= n, items are assigned to shards by round-robin
+    return index % shard[1] == shard[0] - 1
+
+
+def simulate_makespan(durations: list, workers: int) -> float:
+    # Every task is assigned to the worker which is free first, in the order of the durations
+    loads = [0.0 for _ in range(min(workers, len(durations)))]
+    for duration in durations:
+        heapq.heappush(loads, heapq.heappop(loads) + duration)
+    return max(loads) if loads else 0.0
+
+
+class Progress:
+    # Show the progress on the terminal at most every interval seconds, and log the speed when closed
+    def __init__(self, name: str, total: int, interval: float = 0.5) -> None:
+        self.name = name
+        self.total = total
+        self.count = 0
+        self.size = 0
+        self.interval = interval
+        self.start_time = time.monotonic()
+        self.last_time = 0
+        self.show = sys.stderr.isatty() and logger.isEnabledFor(logging.INFO)
+        # the length of the progress line on the terminal, it is cleared before any log is written
+        self.line_length = 0
+        if self.show:
+            for handler in logger.handlers:
+                handler.addFilter(self.clear_line)
+
+    def clear_line(self, record: logging.LogRecord) -> bool:
+        # Used as a filter of the log handlers, so the log is not glued to the progress line
+        if self.line_length != 0:
+            sys.stderr.write("\r" + " " * self.line_length + "\r")
+            sys.stderr.flush()
+            self.line_length = 0
+        return True
+
+    def update(self, size: int = 0, count: int = 1) -> None:
+        self.count += count
+        self.size += size
+        if not self.show:
+            return
+        now = time.monotonic()
+        if now - self.last_time < self.interval and self.count < self.total:
+            return
+        self.last_time = now
+        cost = max(now - self.start_time, 1e-6)
+        line = (f"{self.name}: {self.count}/{self.total}, "
+                f"{self.count / cost:.1f} cases/s, {self.size / 1024 ** 2 / cost:.2f} MB/s")
+        sys.stderr.write("\r" + line.ljust(self.line_length))
+        sys.stderr.flush()
+        self.line_length = len(line)
+
+    def close(self) -> None:
+        if self.show:
+            for handler in logger.handlers:
+                handler.removeFilter(self.clear_line)
+            if self.line_length != 0:
+                sys.stderr.write("\n")
+        cost = max(time.monotonic() - self.start_time, 1e-6)
+        logger.info("%s: %d cases in %.2fs, %.1f cases/s, %.2f MB/s.", self.name, self.count, cost,
+                    self.count / cost, self.size / 1024 ** 2 / cost)